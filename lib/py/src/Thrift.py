@@ -37,6 +37,7 @@ class TType(object):
     UTF8 = 16
     UTF16 = 17
 
+    # index by type ID for an O(1) name lookup; don't scan for a match
     _VALUES_TO_NAMES = (
         'STOP',
         'VOID',
@@ -58,6 +59,12 @@ class TType(object):
         'UTF16',
     )
 
+    _NAMES_TO_VALUES = {
+        name: value
+        for value, name in enumerate(_VALUES_TO_NAMES)
+        if name is not None
+    }
+
 
 class TMessageType(object):
     CALL = 1
@@ -108,6 +115,21 @@ class TApplicationException(TException):
     INVALID_PROTOCOL = 9
     UNSUPPORTED_CLIENT_TYPE = 10
 
+    # default messages, indexed by the type constants above
+    _DEFAULT_MESSAGES = (
+        'Default (unknown) TApplicationException',
+        'Unknown method',
+        'Invalid message type',
+        'Wrong method name',
+        'Bad sequence ID',
+        'Missing result',
+        'Internal error',
+        'Protocol error',
+        'Invalid transform',
+        'Invalid protocol',
+        'Unsupported client type',
+    )
+
     def __init__(self, type=UNKNOWN, message=None):
         TException.__init__(self, message)
         self.type = type
@@ -115,30 +137,25 @@ class TApplicationException(TException):
     def __str__(self):
         if self.message:
             return self.message
-        elif self.type == self.UNKNOWN_METHOD:
-            return 'Unknown method'
-        elif self.type == self.INVALID_MESSAGE_TYPE:
-            return 'Invalid message type'
-        elif self.type == self.WRONG_METHOD_NAME:
-            return 'Wrong method name'
-        elif self.type == self.BAD_SEQUENCE_ID:
-            return 'Bad sequence ID'
-        elif self.type == self.MISSING_RESULT:
-            return 'Missing result'
-        elif self.type == self.INTERNAL_ERROR:
-            return 'Internal error'
-        elif self.type == self.PROTOCOL_ERROR:
-            return 'Protocol error'
-        elif self.type == self.INVALID_TRANSFORM:
-            return 'Invalid transform'
-        elif self.type == self.INVALID_PROTOCOL:
-            return 'Invalid protocol'
-        elif self.type == self.UNSUPPORTED_CLIENT_TYPE:
-            return 'Unsupported client type'
-        else:
-            return 'Default (unknown) TApplicationException'
+        type = self.type
+        if isinstance(type, int) and 0 <= type < len(self._DEFAULT_MESSAGES):
+            return self._DEFAULT_MESSAGES[type]
+        return self._DEFAULT_MESSAGES[self.UNKNOWN]
+
+    thrift_spec = (
+        None,  # 0
+        (1, TType.STRING, 'message', 'UTF8', None, ),  # 1
+        (2, TType.I32, 'type', None, None, ),  # 2
+    )
 
     def read(self, iprot):
+        # take the same C-extension fast path as generated code when the
+        # protocol provides one (e.g. TBinaryProtocolAccelerated)
+        from thrift.transport import TTransport
+        if (iprot._fast_decode is not None and
+                isinstance(iprot.trans, TTransport.CReadableTransport)):
+            iprot._fast_decode(self, iprot, [self.__class__, self.thrift_spec])
+            return
         iprot.readStructBegin()
         while True:
             (fname, ftype, fid) = iprot.readFieldBegin()
@@ -160,6 +177,10 @@ class TApplicationException(TException):
         iprot.readStructEnd()
 
     def write(self, oprot):
+        if oprot._fast_encode is not None:
+            oprot.trans.write(
+                oprot._fast_encode(self, [self.__class__, self.thrift_spec]))
+            return
         oprot.writeStructBegin('TApplicationException')
         if self.message is not None:
             oprot.writeFieldBegin('message', TType.STRING, 1)
@@ -178,10 +199,15 @@ class TFrozenDict(dict):
 
     def __init__(self, *args, **kwargs):
         super(TFrozenDict, self).__init__(*args, **kwargs)
-        # Sort the items so they will be in a consistent order.
+        # XOR the item hashes together: XOR is commutative, so the
+        # result is order-independent (matching dict equality) without
+        # sorting the items or building a tuple of them.
         # XOR in the hash of the class so we don't collide with
         # the hash of a list of tuples.
-        self.__hashval = hash(TFrozenDict) ^ hash(tuple(sorted(self.items())))
+        hashval = hash(TFrozenDict)
+        for item in self.items():
+            hashval ^= hash(item)
+        self.__hashval = hashval
 
     def __setitem__(self, *args):
         raise TypeError("Can't modify frozen TFreezableDict")
@@ -17,7 +17,7 @@
 # under the License.
 #
 
-from struct import pack, unpack
+from struct import pack, unpack, Struct
 
 from .TProtocol import TType, TProtocolBase, TProtocolException, TProtocolFactory
 
@@ -235,6 +235,31 @@ class TBinaryProtocol(TProtocolBase):
         s = self.trans.readAll(size)
         return s
 
+    # struct format codes for scalar element types whose wire encoding
+    # is a fixed-width run, decodable with one batch unpack
+    _SCALAR_LIST_FORMATS = {
+        TType.BYTE: 'b',
+        TType.I16: 'h',
+        TType.I32: 'i',
+        TType.I64: 'q',
+        TType.DOUBLE: 'd',
+    }
+
+    def readContainerList(self, spec):
+        ttype, tspec, is_immutable = spec
+        (list_type, list_len) = self.readListBegin()
+        code = self._SCALAR_LIST_FORMATS.get(ttype)
+        if code is not None and list_len > 0:
+            # one readAll + one unpack for the whole run instead of one
+            # of each per element
+            decoder = Struct('!%d%s' % (list_len, code))
+            results = list(decoder.unpack(self.trans.readAll(decoder.size)))
+        else:
+            read = self._resolve_reader(ttype, tspec)
+            results = [read() for _ in range(list_len)]
+        self.readListEnd()
+        return tuple(results) if is_immutable else results
+
 
 class TBinaryProtocolFactory(TProtocolFactory):
     def __init__(self, strictRead=False, strictWrite=True, **kwargs):
@@ -18,10 +18,9 @@
 #
 
 from thrift.Thrift import TException, TType, TFrozenDict
-from thrift.transport.TTransport import TTransportException
+from thrift.transport.TTransport import TTransportException, CReadableTransport
 
 import sys
-from itertools import islice
 
 
 class TProtocolException(TException):
@@ -44,10 +43,24 @@ class TProtocolException(TException):
 class TProtocolBase(object):
     """Base class for Thrift protocol driver."""
 
+    # slot storage for the hot-path attributes; subclasses don't declare
+    # __slots__ of their own, so they keep an instance __dict__ for
+    # their extra state (and for TProtocolDecorator)
+    __slots__ = ('trans', '_fast_decode', '_fast_encode',
+                 '_read_plans', '_write_plans',
+                 '_element_readers', '_element_writers', '__dict__')
+
     def __init__(self, trans):
         self.trans = trans
         self._fast_decode = None
         self._fast_encode = None
+        # lazily compiled per-spec field plans and element handlers,
+        # keyed by id(thrift_spec) / id(espec); specs live on generated
+        # classes, so the keys are stable
+        self._read_plans = {}
+        self._write_plans = {}
+        self._element_readers = {}
+        self._element_writers = {}
 
     @staticmethod
     def _check_length(limit, length):
@@ -116,7 +129,11 @@ class TProtocolBase(object):
         pass
 
     def writeString(self, str_val):
-        self.writeBinary(bytes(str_val, 'utf-8'))
+        if isinstance(str_val, (bytes, bytearray, memoryview)):
+            # already encoded; skip the utf-8 round trip
+            self.writeBinary(str_val)
+        else:
+            self.writeBinary(bytes(str_val, 'utf-8'))
 
     def writeBinary(self, str_val):
         pass
@@ -181,50 +198,77 @@ class TProtocolBase(object):
     def readBinary(self):
         pass
 
+    def _skip_handler(self, ttype):
+        if 0 <= ttype < len(self._SKIP_TABLE):
+            handler = self._SKIP_TABLE[ttype]
+            if handler is not None:
+                return handler
+        raise TProtocolException(
+            TProtocolException.INVALID_DATA,
+            "invalid TType")
+
     def skip(self, ttype):
-        if ttype == TType.BOOL:
-            self.readBool()
-        elif ttype == TType.BYTE:
-            self.readByte()
-        elif ttype == TType.I16:
-            self.readI16()
-        elif ttype == TType.I32:
-            self.readI32()
-        elif ttype == TType.I64:
-            self.readI64()
-        elif ttype == TType.DOUBLE:
-            self.readDouble()
-        elif ttype == TType.STRING:
-            self.readString()
-        elif ttype == TType.STRUCT:
-            name = self.readStructBegin()
-            while True:
-                (name, ttype, id) = self.readFieldBegin()
-                if ttype == TType.STOP:
-                    break
-                self.skip(ttype)
-                self.readFieldEnd()
-            self.readStructEnd()
-        elif ttype == TType.MAP:
-            (ktype, vtype, size) = self.readMapBegin()
-            for i in range(size):
-                self.skip(ktype)
-                self.skip(vtype)
-            self.readMapEnd()
-        elif ttype == TType.SET:
-            (etype, size) = self.readSetBegin()
-            for i in range(size):
-                self.skip(etype)
-            self.readSetEnd()
-        elif ttype == TType.LIST:
-            (etype, size) = self.readListBegin()
-            for i in range(size):
-                self.skip(etype)
-            self.readListEnd()
-        else:
-            raise TProtocolException(
-                TProtocolException.INVALID_DATA,
-                "invalid TType")
+        self._skip_handler(ttype)(self)
+
+    def _skip_struct(self):
+        self.readStructBegin()
+        while True:
+            (name, ftype, fid) = self.readFieldBegin()
+            if ftype == TType.STOP:
+                break
+            self.skip(ftype)
+            self.readFieldEnd()
+        self.readStructEnd()
+
+    def _skip_map(self):
+        (ktype, vtype, size) = self.readMapBegin()
+        if size > 0:
+            skip_key = self._skip_handler(ktype)
+            skip_val = self._skip_handler(vtype)
+            for _ in range(size):
+                skip_key(self)
+                skip_val(self)
+        self.readMapEnd()
+
+    def _skip_set(self):
+        (etype, size) = self.readSetBegin()
+        if size > 0:
+            skip_elem = self._skip_handler(etype)
+            for _ in range(size):
+                skip_elem(self)
+        self.readSetEnd()
+
+    def _skip_list(self):
+        (etype, size) = self.readListBegin()
+        if size > 0:
+            skip_elem = self._skip_handler(etype)
+            for _ in range(size):
+                skip_elem(self)
+        self.readListEnd()
+
+    # ttype-indexed skip dispatch; None slots are invalid types.  The
+    # scalar slots go through the argument rather than binding methods
+    # here so protocol subclasses' readers are the ones invoked.
+    _SKIP_TABLE = (
+        None,                       # 0 TType.STOP
+        None,                       # 1 TType.VOID
+        lambda p: p.readBool(),     # 2 TType.BOOL
+        lambda p: p.readByte(),     # 3 TType.BYTE and I08
+        lambda p: p.readDouble(),   # 4 TType.DOUBLE
+        None,                       # 5 undefined
+        lambda p: p.readI16(),      # 6 TType.I16
+        None,                       # 7 undefined
+        lambda p: p.readI32(),      # 8 TType.I32
+        None,                       # 9 undefined
+        lambda p: p.readI64(),      # 10 TType.I64
+        lambda p: p.readString(),   # 11 TType.STRING and UTF7
+        _skip_struct,               # 12 TType.STRUCT
+        _skip_map,                  # 13 TType.MAP
+        _skip_set,                  # 14 TType.SET
+        _skip_list,                 # 15 TType.LIST
+        None,                       # 16 TType.UTF8
+        None,                       # 17 TType.UTF16
+    )
 
     # tuple of: ( 'reader method' name, is_container bool, 'writer_method' name )
     _TTYPE_HANDLERS = (
@@ -256,47 +300,99 @@ class TProtocolBase(object):
             return ('readBinary', 'writeBinary', False)
         return self._TTYPE_HANDLERS[ttype] if ttype < len(self._TTYPE_HANDLERS) else (None, None, False)
 
-    def _read_by_ttype(self, ttype, spec, espec):
-        reader_name, _, is_container = self._ttype_handlers(ttype, espec)
-        if reader_name is None:
-            raise TProtocolException(type=TProtocolException.INVALID_DATA,
-                                     message='Invalid type %d' % (ttype))
-        reader_func = getattr(self, reader_name)
-        read = (lambda: reader_func(espec)) if is_container else reader_func
-        while True:
-            yield read()
+    def _resolve_reader(self, ttype, espec):
+        """Return a no-argument callable that reads one value of ttype."""
+        key = (ttype, id(espec))
+        reader = self._element_readers.get(key)
+        if reader is None:
+            reader_name, _, is_container = self._ttype_handlers(ttype, espec)
+            if reader_name is None:
+                raise TProtocolException(type=TProtocolException.INVALID_DATA,
+                                         message='Invalid type %d' % (ttype))
+            reader_func = getattr(self, reader_name)
+            reader = (lambda: reader_func(espec)) if is_container else reader_func
+            self._element_readers[key] = reader
+        return reader
+
+    def _resolve_writer(self, ttype, espec):
+        """Return a one-argument callable that writes one value of ttype."""
+        key = (ttype, id(espec))
+        writer = self._element_writers.get(key)
+        if writer is None:
+            _, writer_name, is_container = self._ttype_handlers(ttype, espec)
+            if writer_name is None:
+                raise TProtocolException(type=TProtocolException.INVALID_DATA,
+                                         message='Invalid type %d' % (ttype))
+            writer_func = getattr(self, writer_name)
+            writer = (lambda v: writer_func(v, espec)) if is_container else writer_func
+            self._element_writers[key] = writer
+        return writer
+
+    def _get_read_plan(self, thrift_spec):
+        """Field id -> (ftype, fname, fspec, reader) for a struct spec."""
+        plan = self._read_plans.get(id(thrift_spec))
+        if plan is None:
+            plan = {}
+            for field in thrift_spec:
+                if field is None:
+                    continue
+                ftype, fname, fspec = field[1], field[2], field[3]
+                plan[field[0]] = (ftype, fname, fspec,
+                                  self._resolve_reader(ftype, fspec))
+            self._read_plans[id(thrift_spec)] = plan
+        return plan
+
+    def _get_write_plan(self, thrift_spec):
+        """List of (fid, ftype, fname, writer) for a struct spec."""
+        plan = self._write_plans.get(id(thrift_spec))
+        if plan is None:
+            plan = []
+            for field in thrift_spec:
+                if field is None:
+                    continue
+                fid, ftype, fname, fspec = field[0], field[1], field[2], field[3]
+                plan.append((fid, ftype, fname,
+                             self._resolve_writer(ftype, fspec)))
+            self._write_plans[id(thrift_spec)] = plan
+        return plan
 
     def readFieldByTType(self, ttype, spec):
-        return next(self._read_by_ttype(ttype, spec, spec))
+        return self._resolve_reader(ttype, spec)()
 
     def readContainerList(self, spec):
         ttype, tspec, is_immutable = spec
         (list_type, list_len) = self.readListBegin()
         # TODO: compare types we just decoded with thrift_spec
-        elems = islice(self._read_by_ttype(ttype, spec, tspec), list_len)
-        results = (tuple if is_immutable else list)(elems)
+        read = self._resolve_reader(ttype, tspec)
+        results = [read() for _ in range(list_len)]
         self.readListEnd()
-        return results
+        return tuple(results) if is_immutable else results
 
     def readContainerSet(self, spec):
         ttype, tspec, is_immutable = spec
         (set_type, set_len) = self.readSetBegin()
         # TODO: compare types we just decoded with thrift_spec
-        elems = islice(self._read_by_ttype(ttype, spec, tspec), set_len)
-        results = (frozenset if is_immutable else set)(elems)
+        read = self._resolve_reader(ttype, tspec)
+        results = {read() for _ in range(set_len)}
         self.readSetEnd()
-        return results
+        return frozenset(results) if is_immutable else results
 
     def readContainerStruct(self, spec):
         (obj_class, obj_spec) = spec
 
         # If obj_class.read is a classmethod (e.g. in frozen structs),
-        # call it as such.
-        if getattr(obj_class.read, '__self__', None) is obj_class:
-            obj = obj_class.read(self)
-        else:
-            obj = obj_class()
-            obj.read(self)
+        # call it as such.  The descriptor inspection is done once per
+        # class and cached, not once per element.
+        try:
+            read_is_classmethod = obj_class.__thrift_read_is_classmethod__
+        except AttributeError:
+            read_is_classmethod = (
+                getattr(obj_class.read, '__self__', None) is obj_class)
+            obj_class.__thrift_read_is_classmethod__ = read_is_classmethod
+        if read_is_classmethod:
+            return obj_class.read(self)
+        obj = obj_class()
+        obj.read(self)
         return obj
 
     def readContainerMap(self, spec):
@@ -304,14 +400,27 @@ class TProtocolBase(object):
         (map_ktype, map_vtype, map_len) = self.readMapBegin()
         # TODO: compare types we just decoded with thrift_spec and
         # abort/skip if types disagree
-        keys = self._read_by_ttype(ktype, spec, kspec)
-        vals = self._read_by_ttype(vtype, spec, vspec)
-        keyvals = islice(zip(keys, vals), map_len)
-        results = (TFrozenDict if is_immutable else dict)(keyvals)
+        read_key = self._resolve_reader(ktype, kspec)
+        read_val = self._resolve_reader(vtype, vspec)
+        # dict comprehensions evaluate the key before the value,
+        # matching the on-wire order
+        results = {read_key(): read_val() for _ in range(map_len)}
+        if is_immutable:
+            results = TFrozenDict(results)
         self.readMapEnd()
         return results
 
     def readStruct(self, obj, thrift_spec, is_immutable=False):
+        # short-circuit to the C decoder when the subclass provides one
+        # and the transport exposes the cstringio interface it needs
+        if (self._fast_decode is not None and thrift_spec is not None and
+                isinstance(self.trans, CReadableTransport)):
+            if is_immutable:
+                # obj is the class here; the decoder builds the instance
+                return self._fast_decode(None, self, [obj, thrift_spec])
+            self._fast_decode(obj, self, [obj.__class__, thrift_spec])
+            return
+        plan = self._get_read_plan(thrift_spec)
         if is_immutable:
             fields = {}
         self.readStructBegin()
@@ -319,21 +428,15 @@ class TProtocolBase(object):
             (fname, ftype, fid) = self.readFieldBegin()
             if ftype == TType.STOP:
                 break
-            try:
-                field = thrift_spec[fid]
-            except IndexError:
-                self.skip(ftype)
-            else:
-                if field is not None and ftype == field[1]:
-                    fname = field[2]
-                    fspec = field[3]
-                    val = self.readFieldByTType(ftype, fspec)
-                    if is_immutable:
-                        fields[fname] = val
-                    else:
-                        setattr(obj, fname, val)
+            entry = plan.get(fid)
+            if entry is not None and ftype == entry[0]:
+                val = entry[3]()
+                if is_immutable:
+                    fields[entry[1]] = val
                 else:
-                    self.skip(ftype)
+                    setattr(obj, entry[1], val)
+            else:
+                self.skip(ftype)
             self.readFieldEnd()
         self.readStructEnd()
         if is_immutable:
@@ -345,68 +448,67 @@ class TProtocolBase(object):
     def writeContainerList(self, val, spec):
         ttype, tspec, _ = spec
         self.writeListBegin(ttype, len(val))
-        for _ in self._write_by_ttype(ttype, val, spec, tspec):
-            pass
+        write = self._resolve_writer(ttype, tspec)
+        for e in val:
+            write(e)
         self.writeListEnd()
 
     def writeContainerSet(self, val, spec):
         ttype, tspec, _ = spec
         self.writeSetBegin(ttype, len(val))
-        for _ in self._write_by_ttype(ttype, val, spec, tspec):
-            pass
+        write = self._resolve_writer(ttype, tspec)
+        for e in val:
+            write(e)
         self.writeSetEnd()
 
     def writeContainerMap(self, val, spec):
         ktype, kspec, vtype, vspec, _ = spec
         self.writeMapBegin(ktype, vtype, len(val))
-        for _ in zip(self._write_by_ttype(ktype, val.keys(), spec, kspec),
-                     self._write_by_ttype(vtype, val.values(), spec, vspec)):
-            pass
+        write_key = self._resolve_writer(ktype, kspec)
+        write_val = self._resolve_writer(vtype, vspec)
+        for k, v in val.items():
+            write_key(k)
+            write_val(v)
         self.writeMapEnd()
 
     def writeStruct(self, obj, thrift_spec):
+        if self._fast_encode is not None and thrift_spec is not None:
+            self.trans.write(
+                self._fast_encode(obj, [obj.__class__, thrift_spec]))
+            return
         self.writeStructBegin(obj.__class__.__name__)
-        for field in thrift_spec:
-            if field is None:
-                continue
-            fname = field[2]
+        for fid, ftype, fname, write in self._get_write_plan(thrift_spec):
             val = getattr(obj, fname)
             if val is None:
                 # skip writing out unset fields
                 continue
-            fid = field[0]
-            ftype = field[1]
-            fspec = field[3]
             self.writeFieldBegin(fname, ftype, fid)
-            self.writeFieldByTType(ftype, val, fspec)
+            write(val)
             self.writeFieldEnd()
         self.writeFieldStop()
         self.writeStructEnd()
 
-    def _write_by_ttype(self, ttype, vals, spec, espec):
-        _, writer_name, is_container = self._ttype_handlers(ttype, espec)
-        writer_func = getattr(self, writer_name)
-        write = (lambda v: writer_func(v, espec)) if is_container else writer_func
-        for v in vals:
-            yield write(v)
-
     def writeFieldByTType(self, ttype, val, spec):
-        next(self._write_by_ttype(ttype, [val], spec, spec))
+        self._resolve_writer(ttype, spec)(val)
+
+
+# (lo, hi, error message) per integer width, looked up once per check
+_INT_LIMITS = {
+    8: (-128, 127,
+        "i8 requires -128 <= number <= 127"),
+    16: (-32768, 32767,
+         "i16 requires -32768 <= number <= 32767"),
+    32: (-2147483648, 2147483647,
+         "i32 requires -2147483648 <= number <= 2147483647"),
+    64: (-9223372036854775808, 9223372036854775807,
+         "i64 requires -9223372036854775808 <= number <= 9223372036854775807"),
+}
 
 
 def checkIntegerLimits(i, bits):
-    if bits == 8 and (i < -128 or i > 127):
-        raise TProtocolException(TProtocolException.INVALID_DATA,
-                                 "i8 requires -128 <= number <= 127")
-    elif bits == 16 and (i < -32768 or i > 32767):
-        raise TProtocolException(TProtocolException.INVALID_DATA,
-                                 "i16 requires -32768 <= number <= 32767")
-    elif bits == 32 and (i < -2147483648 or i > 2147483647):
-        raise TProtocolException(TProtocolException.INVALID_DATA,
-                                 "i32 requires -2147483648 <= number <= 2147483647")
-    elif bits == 64 and (i < -9223372036854775808 or i > 9223372036854775807):
-        raise TProtocolException(TProtocolException.INVALID_DATA,
-                                 "i64 requires -9223372036854775808 <= number <= 9223372036854775807")
+    limits = _INT_LIMITS.get(bits)
+    if limits is not None and (i < limits[0] or i > limits[1]):
+        raise TProtocolException(TProtocolException.INVALID_DATA, limits[2])
 
 
 class TProtocolFactory(object):
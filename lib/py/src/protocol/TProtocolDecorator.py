@@ -20,7 +20,15 @@
 
 class TProtocolDecorator(object):
     def __new__(cls, protocol, *args, **kwargs):
+        # pick up slot-backed state (e.g. TProtocolBase.trans) as well
+        # as the instance __dict__ of the wrapped protocol
+        namespace = {}
+        for klass in reversed(type(protocol).__mro__):
+            for name in getattr(klass, '__slots__', ()):
+                if name != '__dict__' and hasattr(protocol, name):
+                    namespace[name] = getattr(protocol, name)
+        namespace.update(protocol.__dict__)
         decorated_cls = type(''.join(['Decorated', protocol.__class__.__name__]),
                              (cls, protocol.__class__),
-                             protocol.__dict__)
+                             namespace)
         return object.__new__(decorated_cls)
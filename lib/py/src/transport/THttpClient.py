@@ -17,8 +17,9 @@
 # under the License.
 #
 
-from io import BytesIO
+from io import BufferedReader
 import os
+import socket
 import ssl
 import sys
 import warnings
@@ -34,6 +35,8 @@ from .TTransport import TTransportBase
 class THttpClient(TTransportBase):
     """Http implementation of TTransport base."""
 
+    CONTENT_TYPE = 'application/x-thrift'
+
     def __init__(self, uri_or_host, port=None, path=None, cafile=None, cert_file=None, key_file=None, ssl_context=None):
         """THttpClient supports two different types of construction:
 
@@ -88,12 +91,31 @@ class THttpClient(TTransportBase):
             self.proxy_auth = self.basic_proxy_auth_header(parsed)
         else:
             self.realhost = self.realport = self.proxy_auth = None
-        self.__wbuf = BytesIO()
+        self.__wbuf = bytearray()
         self.__http = None
         self.__http_response = None
+        self.__response_buf = None
         self.__timeout = None
         self.__custom_headers = None
         self.headers = None
+        # invariant for the life of the process; don't rebuild per RPC
+        user_agent = 'Python/THttpClient'
+        script = os.path.basename(sys.argv[0])
+        if script:
+            user_agent = '%s (%s)' % (user_agent, urllib.parse.quote(script))
+        self.__default_user_agent = user_agent
+        self.__static_headers = self.__buildStaticHeaders()
+
+    def __buildStaticHeaders(self):
+        """Pre-render the header lines that don't change between RPCs."""
+        headers = [('Content-Type', self.CONTENT_TYPE),
+                   ('Connection', 'keep-alive')]
+        if not self.__custom_headers or 'User-Agent' not in self.__custom_headers:
+            headers.append(('User-Agent', self.__default_user_agent))
+        if self.__custom_headers:
+            headers.extend(self.__custom_headers.items())
+        return b'\r\n'.join(
+            ('%s: %s' % kv).encode('latin-1') for kv in headers)
 
     @staticmethod
     def basic_proxy_auth_header(proxy):
@@ -123,6 +145,7 @@ class THttpClient(TTransportBase):
         self.__http.close()
         self.__http = None
         self.__http_response = None
+        self.__response_buf = None
 
     def isOpen(self):
         return self.__http is not None
@@ -135,22 +158,52 @@ class THttpClient(TTransportBase):
 
     def setCustomHeaders(self, headers):
         self.__custom_headers = headers
+        self.__static_headers = self.__buildStaticHeaders()
 
     def read(self, sz):
-        return self.__http_response.read(sz)
+        return self.__response_buf.read(sz)
 
     def write(self, buf):
-        self.__wbuf.write(buf)
+        self.__wbuf.extend(buf)
 
     def flush(self):
-        if self.isOpen():
-            self.close()
-        self.open()
+        # Hand off the buffer without copying; http.client accepts any
+        # object with the buffer interface as a message body
+        data = self.__wbuf
+        self.__wbuf = bytearray()
+
+        # Reuse the connection across requests (keep-alive) instead of
+        # paying a TCP (and for https a TLS) handshake per RPC.  Retry
+        # once when the server has closed an idle connection under us.
+        for attempt in range(2):
+            if not self.isOpen():
+                self.open()
+            try:
+                if self.__http_response is not None:
+                    # drain the previous response so the connection can
+                    # carry the next request
+                    self.__http_response.read()
+                    self.__http_response.close()
+                    self.__http_response = None
+                    self.__response_buf = None
+                self.__sendRequest(data)
+                self.__http_response = self.__http.getresponse()
+                break
+            except (http.client.BadStatusLine, ConnectionResetError,
+                    BrokenPipeError):
+                if attempt:
+                    raise
+                self.close()
 
-        # Pull data out of buffer
-        data = self.__wbuf.getvalue()
-        self.__wbuf = BytesIO()
+        self.code = self.__http_response.status
+        self.message = self.__http_response.reason
+        self.headers = self.__http_response.msg
+        # serve the protocol layer's many small reads from an
+        # in-process buffer rather than the response object directly
+        self.__response_buf = BufferedReader(self.__http_response,
+                                             buffer_size=65536)
 
+    def __sendRequest(self, data):
         # HTTP request
         if self.using_proxy() and self.scheme == "http":
             # need full URL of real host for HTTP proxy here (HTTPS uses CONNECT tunnel)
@@ -159,22 +212,13 @@ class THttpClient(TTransportBase):
         else:
             self.__http.putrequest('POST', self.path)
 
-        # Write headers
-        self.__http.putheader('Content-Type', 'application/x-thrift')
+        # Write the per-request headers; the invariant ones go in as one
+        # pre-rendered blob appended straight to the output buffer
         self.__http.putheader('Content-Length', str(len(data)))
         if self.using_proxy() and self.scheme == "http" and self.proxy_auth is not None:
             self.__http.putheader("Proxy-Authorization", self.proxy_auth)
-
-        if not self.__custom_headers or 'User-Agent' not in self.__custom_headers:
-            user_agent = 'Python/THttpClient'
-            script = os.path.basename(sys.argv[0])
-            if script:
-                user_agent = '%s (%s)' % (user_agent, urllib.parse.quote(script))
-            self.__http.putheader('User-Agent', user_agent)
-
-        if self.__custom_headers:
-            for key, val in self.__custom_headers.items():
-                self.__http.putheader(key, val)
+        if self.__static_headers:
+            self.__http._output(self.__static_headers)
 
         # Saves the cookie sent by the server in the previous response.
         # HTTPConnection.putheader can only be called after a request has been
@@ -182,13 +226,11 @@ class THttpClient(TTransportBase):
         if self.headers and 'Set-Cookie' in self.headers:
             self.__http.putheader('Cookie', self.headers['Set-Cookie'])
 
-        self.__http.endheaders()
-
-        # Write payload
-        self.__http.send(data)
+        # Send headers and payload in a single write so the request
+        # doesn't straddle two packets and trip over Nagle's algorithm.
+        self.__http.endheaders(message_body=data)
 
-        # Get reply to flush the request
-        self.__http_response = self.__http.getresponse()
-        self.code = self.__http_response.status
-        self.message = self.__http_response.reason
-        self.headers = self.__http_response.msg
+        # Disable Nagle for anything written after this request.
+        if self.__http.sock is not None:
+            self.__http.sock.setsockopt(
+                socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
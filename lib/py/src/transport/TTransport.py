@@ -44,6 +44,9 @@ class TTransportException(TException):
 class TTransportBase(object):
     """Base class for Thrift transport layer."""
 
+    # no attributes of its own; lets subclasses opt into __slots__
+    __slots__ = ()
+
     def isOpen(self):
         pass
 
@@ -232,6 +235,16 @@ class TMemoryBuffer(TTransportBase, CReadableTransport):
     def read(self, sz):
         return self._buffer.read(sz)
 
+    def read_view(self, sz):
+        """Read up to sz bytes as a zero-copy memoryview of the internal
+        buffer.  The buffer cannot be written to or closed until the view
+        is released (or garbage collected)."""
+        buf = self._buffer
+        pos = buf.tell()
+        view = buf.getbuffer()[pos:pos + sz]
+        buf.seek(pos + len(view))
+        return view
+
     def write(self, buf):
         self._buffer.write(buf)
 
@@ -241,6 +254,10 @@ class TMemoryBuffer(TTransportBase, CReadableTransport):
     def getvalue(self):
         return self._buffer.getvalue()
 
+    def size(self):
+        """Number of bytes in the buffer, without copying them out."""
+        return self._buffer.getbuffer().nbytes
+
     # Implement the CReadableTransport interface.
     @property
     def cstringio_buf(self):
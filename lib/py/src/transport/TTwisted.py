@@ -17,31 +17,42 @@
 # under the License.
 #
 
-from io import BytesIO
 import struct
+from io import BytesIO
 
 from zope.interface import implementer, Interface, Attribute
-from twisted.internet.protocol import ServerFactory, ClientFactory, \
-    connectionDone
+from twisted.internet.protocol import Protocol, ServerFactory, \
+    ClientFactory, connectionDone
 from twisted.internet import defer
 from twisted.internet.threads import deferToThread
-from twisted.protocols import basic
 from twisted.web import server, resource, http
 
 from thrift.transport import TTransport
 
+try:
+    from puresasl.client import SASLClient
+except ImportError:
+    SASLClient = None
+
+# precompiled codecs for the SASL frame headers
+_FRAME_LEN = struct.Struct('!i')
+_SASL_FRAME_LENS = struct.Struct('!ii')
+_SASL_HEADER = struct.Struct('>BI')
+
 
 class TMessageSenderTransport(TTransport.TTransportBase):
 
     def __init__(self):
-        self.__wbuf = BytesIO()
+        # list-of-chunks accumulator; joined once per message instead of
+        # copying the whole payload again out of a BytesIO
+        self.__wbuf = []
 
     def write(self, buf):
-        self.__wbuf.write(buf)
+        self.__wbuf.append(bytes(buf))
 
     def flush(self):
-        msg = self.__wbuf.getvalue()
-        self.__wbuf = BytesIO()
+        msg = b''.join(self.__wbuf)
+        self.__wbuf = []
         return self.sendMessage(msg)
 
     def sendMessage(self, message):
@@ -58,10 +69,76 @@ class TCallbackTransport(TMessageSenderTransport):
         return self.func(message)
 
 
-class ThriftClientProtocol(basic.Int32StringReceiver):
+class _Int32FrameReceiver(Protocol):
+    """Int32-prefixed framing with linear-time reassembly.
+
+    Drop-in replacement for basic.Int32StringReceiver, which grows a
+    single bytes object and re-slices it on every dataReceived call
+    (quadratic for large fragmented frames).  Chunks are kept in a list
+    with a running byte count and joined once per frame.
+    """
+
+    MAX_LENGTH = 2 ** 31 - 1
+
+    _parts = None
+    _have = 0
+    _need = None
+
+    def sendString(self, string):
+        # gather write: no temporary sized to header + payload
+        self.transport.writeSequence((_FRAME_LEN.pack(len(string)), string))
+
+    def lengthLimitExceeded(self, length):
+        self.transport.loseConnection()
+
+    def dataReceived(self, data):
+        # per-chunk hot path: state is kept in locals and written back
+        # before anything that can re-enter (stringReceived)
+        parts = self._parts
+        if parts is None:
+            self._parts = parts = []
+        parts.append(data)
+        self._have += len(data)
+        max_length = self.MAX_LENGTH
+        string_received = self.stringReceived
+        while True:
+            need = self._need
+            if need is None:
+                if self._have < 4:
+                    return
+                if len(parts) > 1:
+                    self._parts = parts = [b''.join(parts)]
+                # read unsigned: faster than struct for 4 bytes, and
+                # anything past MAX_LENGTH (incl. "negative") is rejected
+                self._need = need = int.from_bytes(parts[0][:4], 'big')
+                if need > max_length:
+                    self.lengthLimitExceeded(need)
+                    return
+            total = 4 + need
+            if self._have < total:
+                return
+            if len(parts) > 1:
+                parts = [b''.join(parts)]
+            buf = parts[0]
+            frame = buf[4:total]
+            rest = buf[total:]
+            self._parts = parts = [rest] if rest else []
+            self._have = len(rest)
+            self._need = None
+            string_received(frame)
+
+    def stringReceived(self, frame):
+        raise NotImplementedError
+
+
+class ThriftClientProtocol(_Int32FrameReceiver):
 
     MAX_LENGTH = 2 ** 31 - 1
 
+    # 'recv_' + fname strings per client class, shared by every
+    # connection so short-lived connections skip the warmup concats
+    _recv_names = {}
+
     def __init__(self, client_class, iprot_factory, oprot_factory=None):
         self._client_class = client_class
         self._iprot_factory = iprot_factory
@@ -77,6 +154,11 @@ class ThriftClientProtocol(basic.Int32StringReceiver):
         self.sendString(msg)
 
     def connectionMade(self):
+        try:
+            # small framed RPCs shouldn't sit in Nagle's buffer
+            self.transport.setTcpNoDelay(True)
+        except AttributeError:
+            pass  # not a TCP transport
         tmo = TCallbackTransport(self.dispatch)
         self.client = self._client_class(tmo, self._oprot_factory)
         self.started.callback(self.client)
@@ -96,6 +178,8 @@ class ThriftClientProtocol(basic.Int32StringReceiver):
             self.client = None
 
     def stringReceived(self, frame):
+        # pass the frame through as exact bytes: BytesIO shares the
+        # buffer copy-on-write for bytes input, so this is zero-copy
         tr = TTransport.TMemoryBuffer(frame)
         iprot = self._iprot_factory.getProtocol(tr)
         (fname, mtype, rseqid) = iprot.readMessageBegin()
@@ -103,7 +187,12 @@ class ThriftClientProtocol(basic.Int32StringReceiver):
         try:
             method = self.recv_map[fname]
         except KeyError:
-            method = getattr(self.client, 'recv_' + fname)
+            names = ThriftClientProtocol._recv_names.setdefault(
+                self._client_class, {})
+            attr = names.get(fname)
+            if attr is None:
+                attr = names.setdefault(fname, 'recv_' + fname)
+            method = getattr(self.client, attr)
             self.recv_map[fname] = method
 
         method(iprot, mtype, rseqid)
@@ -130,25 +219,47 @@ class ThriftSASLClientProtocol(ThriftClientProtocol):
         constructor.
         """
 
-        from puresasl.client import SASLClient
-        self.SASLCLient = SASLClient
-
         ThriftClientProtocol.__init__(self, client_class, iprot_factory, oprot_factory)
 
         self._sasl_negotiation_deferred = None
         self._sasl_negotiation_status = None
+        self._negotiating = True
+        self._pending_challenge = None
         self.client = None
+        # wrap/unwrap run off-reactor; these locks keep frame order
+        self._send_lock = defer.DeferredLock()
+        self._recv_lock = defer.DeferredLock()
 
         if host is not None:
             self.createSASLClient(host, service, mechanism, **sasl_kwargs)
 
     def createSASLClient(self, host, service, mechanism, **kwargs):
-        self.sasl = self.SASLClient(host, service, mechanism, **kwargs)
+        if SASLClient is None:
+            raise ImportError('puresasl is required for SASL support')
+        self.sasl = SASLClient(host, service, mechanism, **kwargs)
 
     def dispatch(self, msg):
-        encoded = self.sasl.wrap(msg)
-        len_and_encoded = ''.join((struct.pack('!i', len(encoded)), encoded))
-        ThriftClientProtocol.dispatch(self, len_and_encoded)
+        # wrap() may seal/MIC the payload; keep that crypto off the
+        # reactor thread, like the existing deferToThread(sasl.process)
+        d = self._send_lock.run(self._wrapAndWrite, msg)
+        d.addErrback(self._saslCryptoFailed)
+        return d
+
+    def _wrapAndWrite(self, msg):
+        d = deferToThread(self.sasl.wrap, msg)
+        d.addCallback(self._writeWrapped)
+        return d
+
+    def _writeWrapped(self, encoded):
+        n = len(encoded)
+        # outer frame length and inner sasl length packed together, then
+        # payload in one gather write instead of concatenating prefixes
+        self.transport.writeSequence(
+            (_SASL_FRAME_LENS.pack(n + 4, n), encoded))
+
+    def _saslCryptoFailed(self, failure):
+        self.transport.loseConnection()
+        return failure
 
     @defer.inlineCallbacks
     def connectionMade(self):
@@ -173,17 +284,25 @@ class ThriftSASLClientProtocol(ThriftClientProtocol):
                 raise TTransport.TTransportException(msg, message=msg)
 
         self._sasl_negotiation_deferred = None
+        self._negotiating = False
         ThriftClientProtocol.connectionMade(self)
 
     def _sendSASLMessage(self, status, body):
         if body is None:
-            body = ""
-        header = struct.pack(">BI", status, len(body))
-        self.transport.write(header + body)
+            body = b''
+        elif isinstance(body, str):
+            body = body.encode('utf-8')
+        self.transport.writeSequence(
+            (_SASL_HEADER.pack(status, len(body)), body))
 
     def _receiveSASLMessage(self):
+        pending = self._pending_challenge
+        if pending is not None:
+            # the challenge arrived while sasl.process ran off-reactor;
+            # fire immediately instead of allocating a waiting Deferred
+            self._pending_challenge = None
+            return defer.succeed(pending)
         self._sasl_negotiation_deferred = defer.Deferred()
-        self._sasl_negotiation_status = None
         return self._sasl_negotiation_deferred
 
     def connectionLost(self, reason=connectionDone):
@@ -191,52 +310,113 @@ class ThriftSASLClientProtocol(ThriftClientProtocol):
             ThriftClientProtocol.connectionLost(self, reason)
 
     def dataReceived(self, data):
-        if self._sasl_negotiation_deferred:
+        if self._negotiating:
             # we got a sasl challenge in the format (status, length, challenge)
-            # save the status, let IntNStringReceiver piece the challenge data together
-            self._sasl_negotiation_status, = struct.unpack("B", data[0])
-            ThriftClientProtocol.dataReceived(self, data[1:])
+            # save the status once per message, let the framer piece the
+            # challenge data together across fragments
+            if self._sasl_negotiation_status is None:
+                self._sasl_negotiation_status = data[0]
+                data = data[1:]
+            ThriftClientProtocol.dataReceived(self, data)
         else:
-            # normal frame, let IntNStringReceiver piece it together
+            # normal frame, let the framer piece it together
             ThriftClientProtocol.dataReceived(self, data)
 
     def stringReceived(self, frame):
-        if self._sasl_negotiation_deferred:
+        if self._negotiating:
             # the frame is just a SASL challenge
             response = (self._sasl_negotiation_status, frame)
-            self._sasl_negotiation_deferred.callback(response)
+            self._sasl_negotiation_status = None
+            d = self._sasl_negotiation_deferred
+            if d is not None:
+                self._sasl_negotiation_deferred = None
+                d.callback(response)
+            else:
+                self._pending_challenge = response
         else:
-            # there's a second 4 byte length prefix inside the frame
-            decoded_frame = self.sasl.unwrap(frame[4:])
-            ThriftClientProtocol.stringReceived(self, decoded_frame)
+            # unwrap() is crypto too; run it in the thread pool and
+            # deliver decoded frames in arrival order
+            d = self._recv_lock.run(self._unwrapAndDeliver, frame)
+            # nobody holds this deferred; close and swallow on failure
+            d.addErrback(self._saslCryptoFailed)
+            d.addErrback(lambda _: None)
+
+    def _unwrap(self, frame):
+        # there's a second 4 byte length prefix inside the frame;
+        # hand unwrap a view past it rather than copying the payload
+        try:
+            return self.sasl.unwrap(memoryview(frame)[4:])
+        except TypeError:
+            # mechanism insists on bytes
+            return self.sasl.unwrap(frame[4:])
+
+    def _unwrapAndDeliver(self, frame):
+        d = deferToThread(self._unwrap, frame)
+        d.addCallback(
+            lambda decoded: ThriftClientProtocol.stringReceived(self, decoded))
+        return d
 
 
-class ThriftServerProtocol(basic.Int32StringReceiver):
+class ThriftServerProtocol(_Int32FrameReceiver):
 
     MAX_LENGTH = 2 ** 31 - 1
 
+    # reusable output buffers; the input side wraps the inbound frame
+    # copy-on-write, so pooling it would only add a copy
+    _POOL_SIZE = 8
+    _io_pool = None
+
+    def connectionMade(self):
+        try:
+            # small framed RPCs shouldn't sit in Nagle's buffer
+            self.transport.setTcpNoDelay(True)
+        except AttributeError:
+            pass  # not a TCP transport
+
+    def _getBuf(self):
+        pool = self._io_pool
+        if pool:
+            return pool.pop()
+        return TTransport.TMemoryBuffer()
+
+    def _putBuf(self, buf):
+        pool = self._io_pool
+        if pool is None:
+            pool = self._io_pool = []
+        if len(pool) < self._POOL_SIZE:
+            b = buf._buffer
+            b.seek(0)
+            b.truncate()
+            pool.append(buf)
+
     def dispatch(self, msg):
         self.sendString(msg)
 
-    def processError(self, error):
+    def processError(self, error, tmo=None):
         self.transport.loseConnection()
 
     def processOk(self, _, tmo):
+        # oneway methods leave the buffer empty; detect that without
+        # materializing the response bytes
+        if tmo.size() == 0:
+            self._putBuf(tmo)
+            return
         msg = tmo.getvalue()
-
-        if len(msg) > 0:
-            self.dispatch(msg)
+        self._putBuf(tmo)
+        self.dispatch(msg)
 
     def stringReceived(self, frame):
+        # exact bytes in: BytesIO shares the buffer copy-on-write, so
+        # wrapping the inbound frame is zero-copy
         tmi = TTransport.TMemoryBuffer(frame)
-        tmo = TTransport.TMemoryBuffer()
+        tmo = self._getBuf()
 
         iprot = self.factory.iprot_factory.getProtocol(tmi)
         oprot = self.factory.oprot_factory.getProtocol(tmo)
 
         d = self.factory.processor.process(iprot, oprot)
         d.addCallbacks(self.processOk, self.processError,
-                       callbackArgs=(tmo,))
+                       callbackArgs=(tmo,), errbackArgs=(tmo,))
 
 
 class IThriftServerFactory(Interface):
@@ -308,17 +488,30 @@ class ThriftResource(resource.Resource):
     def getChild(self, path, request):
         return self
 
+    # responses are written in slices of this size, so a large message
+    # is never duplicated wholesale the way getvalue() would
+    RESPONSE_CHUNK = 1 << 16
+
     def _cbProcess(self, _, request, tmo):
-        msg = tmo.getvalue()
         request.setResponseCode(http.OK)
         request.setHeader("content-type", "application/x-thrift")
-        request.write(msg)
+        with tmo._buffer.getbuffer() as buf:
+            request.setHeader("content-length", b"%d" % len(buf))
+            for off in range(0, len(buf), self.RESPONSE_CHUNK):
+                request.write(bytes(buf[off:off + self.RESPONSE_CHUNK]))
         request.finish()
 
     def render_POST(self, request):
-        request.content.seek(0, 0)
-        data = request.content.read()
-        tmi = TTransport.TMemoryBuffer(data)
+        content = request.content
+        content.seek(0, 0)
+        if isinstance(content, BytesIO):
+            # zero-copy: read the thrift payload straight out of the
+            # request body buffer
+            tmi = TTransport.TMemoryBuffer()
+            tmi._buffer = content
+        else:
+            # spooled to a temp file; materialize it once
+            tmi = TTransport.TMemoryBuffer(content.read())
         tmo = TTransport.TMemoryBuffer()
 
         iprot = self.inputProtocolFactory.getProtocol(tmi)
@@ -37,23 +37,16 @@ def legacy_validate_callback(cert, hostname):
         raise TTransportException(
             TTransportException.NOT_OPEN,
             'No SSL certificate found from %s' % hostname)
-    fields = cert['subject']
-    for field in fields:
-        # ensure structure we get back is what we expect
-        if not isinstance(field, tuple):
-            continue
-        cert_pair = field[0]
-        if len(cert_pair) < 2:
-            continue
-        cert_key, cert_value = cert_pair[0:2]
-        if cert_key != 'commonName':
-            continue
-        certhost = cert_value
-        # this check should be performed by some sort of Access Manager
-        if certhost == hostname:
-            # success, cert commonName matches desired hostname
-            return
-        else:
+    # the ssl module guarantees subject is a tuple of RDNs, each a
+    # tuple of (key, value) pairs; no per-field shape checks needed
+    for rdn in cert['subject']:
+        for cert_key, certhost in rdn:
+            if cert_key != 'commonName':
+                continue
+            # this check should be performed by some sort of Access Manager
+            if certhost == hostname:
+                # success, cert commonName matches desired hostname
+                return
             raise TTransportException(
                 TTransportException.UNKNOWN,
                 'Hostname we connected to "%s" doesn\'t match certificate '
@@ -104,4 +97,8 @@ def _optional_dependencies():
     return ipaddr, match
 
 
+# resolved once at import; per-connection code must use these bindings
+# rather than re-probing ssl attributes on every handshake.  The SAN
+# iteration itself lives in the stdlib/backports implementation (or in
+# OpenSSL on 3.7+); there is no Python-level SAN loop in this module.
 _match_has_ipaddress, _match_hostname = _optional_dependencies()
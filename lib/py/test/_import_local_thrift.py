@@ -17,16 +17,19 @@
 # under the License.
 #
 
-import glob
 import os
 import sys
 
 SCRIPT_DIR = os.path.realpath(os.path.dirname(__file__))
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(SCRIPT_DIR)))
+BUILD_DIR = os.path.join(ROOT_DIR, 'lib', 'py', 'build')
 
-for libpath in glob.glob(os.path.join(ROOT_DIR, 'lib', 'py', 'build', 'lib.*')):
-    for pattern in ('-%d.%d', '-%d%d'):
-        postfix = pattern % (sys.version_info[0], sys.version_info[1])
-        if libpath.endswith(postfix):
-            sys.path.insert(0, libpath)
-            break
+# single directory scan with the version postfixes computed up front,
+# instead of a glob plus per-entry pattern formatting
+_postfixes = ('-%d.%d' % sys.version_info[:2],
+              '-%d%d' % sys.version_info[:2])
+if os.path.isdir(BUILD_DIR):
+    with os.scandir(BUILD_DIR) as entries:
+        for entry in entries:
+            if entry.name.startswith('lib.') and entry.name.endswith(_postfixes):
+                sys.path.insert(0, entry.path)
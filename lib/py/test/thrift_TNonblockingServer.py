@@ -17,11 +17,11 @@
 # under the License.
 #
 
+import logging
 import os
 import sys
 import threading
 import unittest
-import time
 
 gen_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gen-py")
 sys.path.append(gen_path)
@@ -31,6 +31,8 @@ from thrift.transport import TSocket, TTransport
 from thrift.protocol import TBinaryProtocol
 from thrift.server import TNonblockingServer
 
+_log = logging.getLogger(__name__)
+
 
 class Handler:
 
@@ -43,13 +45,22 @@ class Server:
     def __init__(self):
         handler = Handler()
         processor = TestServer.Processor(handler)
-        transport = TSocket.TServerSocket("127.0.0.1", 30030)
+        # an ephemeral port avoids collisions and TIME_WAIT flakes on a
+        # fixed one; the bound port is read back after prepare()
+        transport = TSocket.TServerSocket("127.0.0.1", 0)
         self.server = TNonblockingServer.TNonblockingServer(processor, transport)
+        self.port = None
+
+    def prepare(self):
+        # binds, listens and starts the workers synchronously; clients
+        # may connect as soon as this returns
+        self.server.prepare()
+        self.port = self.server.socket.handle.getsockname()[1]
 
     def start_server(self):
-        print("-------start server ------\n")
+        _log.debug('start server')
         self.server.serve()
-        print("------stop server -----\n")
+        _log.debug('stop server')
 
     def close_server(self):
         self.server.stop()
@@ -58,8 +69,8 @@ class Server:
 
 class Client:
 
-    def start_client(self):
-        transport = TSocket.TSocket("127.0.0.1", 30030)
+    def start_client(self, port):
+        transport = TSocket.TSocket("127.0.0.1", port)
         trans = TTransport.TFramedTransport(transport)
         protocol = TBinaryProtocol.TBinaryProtocol(trans)
         client = TestServer.Client(protocol)
@@ -67,12 +78,7 @@ class Client:
         self.msg = client.add_and_get_msg("hello thrift")
 
     def get_message(self):
-        try:
-            msg = self.msg
-            return msg
-        except AttributeError as e:
-            raise e
-            print("self.msg not exit\n")
+        return self.msg
 
 
 class TestNonblockingServer(unittest.TestCase):
@@ -81,18 +87,18 @@ class TestNonblockingServer(unittest.TestCase):
         serve = Server()
         client = Client()
 
+        # listen before the client thread exists instead of sleeping and
+        # hoping the server thread got that far
+        serve.prepare()
         serve_thread = threading.Thread(target=serve.start_server)
-        client_thread = threading.Thread(target=client.start_client)
+        client_thread = threading.Thread(target=client.start_client,
+                                         args=(serve.port,))
         serve_thread.start()
-        time.sleep(10)
         client_thread.start()
         client_thread.join(0.5)
         try:
             msg = client.get_message()
             self.assertEqual("hello thrift", msg)
-        except AssertionError as e:
-            raise e
-            print("assert failure")
         finally:
             serve.close_server()
 
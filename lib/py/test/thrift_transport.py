@@ -17,8 +17,10 @@
 # under the License.
 #
 
-import unittest
+import io
 import os
+import tempfile
+import unittest
 
 import _import_local_thrift  # noqa
 from thrift.transport import TTransport
@@ -27,42 +29,63 @@ from thrift.transport import TTransport
 class TestTFileObjectTransport(unittest.TestCase):
 
     def test_TFileObjectTransport(self):
-        test_dir = os.path.dirname(os.path.abspath(__file__))
-        datatxt_path = os.path.join(test_dir, 'data.txt')
         buffer = '{"soft":"thrift","version":0.13,"1":true}'
-        with open(datatxt_path, "w+") as f:
-            buf = TTransport.TFileObjectTransport(f)
-            buf.write(buffer)
-            buf.flush()
-            buf.close()
+        with tempfile.TemporaryDirectory() as test_dir:
+            datatxt_path = os.path.join(test_dir, 'data.txt')
+            with open(datatxt_path, "w+") as f:
+                buf = TTransport.TFileObjectTransport(f)
+                buf.write(buffer)
+                buf.flush()
+                buf.close()
+
+            with open(datatxt_path, "rb") as f:
+                buf = TTransport.TFileObjectTransport(f)
+                value = buf.read(len(buffer)).decode('utf-8')
+                self.assertEqual(buffer, value)
+                buf.close()
 
-        with open(datatxt_path, "rb") as f:
-            buf = TTransport.TFileObjectTransport(f)
-            value = buf.read(len(buffer)).decode('utf-8')
-            self.assertEqual(buffer, value)
-            buf.close()
-        os.remove(datatxt_path)
+    def test_TFileObjectTransport_memory(self):
+        # same contract without touching the filesystem
+        data = b'{"soft":"thrift","version":0.13,"1":true}'
+        backing = io.BytesIO()
+        buf = TTransport.TFileObjectTransport(backing)
+        buf.write(data)
+        buf.flush()
+        backing.seek(0)
+        self.assertEqual(buf.read(len(data)), data)
+        buf.close()
 
 
 class TestMemoryBuffer(unittest.TestCase):
 
     def test_memorybuffer_write(self):
-        data = '{"1":[1,"hello"],"a":{"A":"abc"},"bool":true,"num":12345}'
+        data = b'{"1":[1,"hello"],"a":{"A":"abc"},"bool":true,"num":12345}'
 
         buffer_w = TTransport.TMemoryBuffer()
-        buffer_w.write(data.encode('utf-8'))
+        buffer_w.write(data)
         value = buffer_w.getvalue()
-        self.assertEqual(value.decode('utf-8'), data)
+        self.assertEqual(value, data)
         buffer_w.close()
 
     def test_memorybuffer_read(self):
-        data = '{"1":[1, "hello"],"a":{"A":"abc"},"bool":true,"num":12345}'
+        data = b'{"1":[1, "hello"],"a":{"A":"abc"},"bool":true,"num":12345}'
 
-        buffer_r = TTransport.TMemoryBuffer(data.encode('utf-8'))
+        buffer_r = TTransport.TMemoryBuffer(data)
         value_r = buffer_r.read(len(data))
         value = buffer_r.getvalue()
-        self.assertEqual(value.decode('utf-8'), data)
-        self.assertEqual(value_r.decode('utf-8'), data)
+        self.assertEqual(value, data)
+        self.assertEqual(value_r, data)
+        buffer_r.close()
+
+    def test_memorybuffer_read_view(self):
+        data = b'{"1":[1,"hello"],"a":{"A":"abc"},"bool":true,"num":12345}'
+
+        buffer_r = TTransport.TMemoryBuffer(data)
+        view = buffer_r.read_view(len(data))
+        self.assertEqual(bytes(view), data)
+        # the view is over the buffer itself; reading advanced the position
+        self.assertEqual(buffer_r.read(1), b'')
+        view.release()
         buffer_r.close()
 
 
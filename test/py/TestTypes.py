@@ -21,12 +21,16 @@ from ThriftTest import ThriftTest
 from ThriftTest.ThriftTest import Client
 from ThriftTest.ttypes import Xtruct
 
+import mmap
 import unittest
 
-# only run this test if the string 'options string: py:type_hints' esxists in the file 
+# only run this test if the string 'options string: py:type_hints' exists in the file
 def has_type_hints_option():
-    with open(ThriftTest.__file__) as f:
-        return 'options string: py:type_hints' in f.read()
+    # search the raw bytes via mmap: no utf-8 decode and no full copy
+    # of the (potentially large) generated module
+    with open(ThriftTest.__file__, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm.find(b'options string: py:type_hints') != -1
 
 @unittest.skipUnless(has_type_hints_option(), "type hints not enabled")
 class TypeAnnotationsTest(unittest.TestCase):